@@ -9,12 +9,34 @@ from prompt_toolkit.styles import Style
 from prompt_toolkit.key_binding import KeyBindings        
 import os
 import json
+import hashlib
+import re
+import textwrap
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # ---  Configuration Management ---
 # This section handles loading and saving configuration.
 CONFIG_DIR = click.get_app_dir("llm-git-commit")
 CONFIG_FILE = os.path.join(CONFIG_DIR, "config.json")
+STATS_FILE = os.path.join(CONFIG_DIR, "stats.json")
+EXCLUDE_CACHE_FILE = os.path.join(CONFIG_DIR, "exclude_cache.json")
+SESSIONS_DIR = os.path.join(CONFIG_DIR, "sessions")
 DEFAULT_MAX_CHARS = 15000
+MAX_STATS_HISTORY = 200
+SESSION_MAX_AGE_DAYS = 14
+SESSION_MAX_COUNT = 50
+MAX_SUBMODULE_WORKERS = 8
+ROUTE_LIMIT_KEYS = (("max-chars", "chars"), ("max-tokens", "tokens"), ("max-files", "files"))
+DIFF_CHANGE_KINDS = ("added", "modified", "deleted", "renamed", "binary")
+
+# --- Diff Exclusions ---
+# Files matched by the repo's ignore file, or marked as generated / non-diffable in
+# .gitattributes, are excluded via pathspecs so git never produces their hunks.
+EXCLUDE_FILE_NAME = ".llm-git-commit-ignore"
+ATTRIBUTE_EXCLUDES = [("attr:linguist-generated", ""), ("attr:linguist-generated=true", ""), ("attr:-diff", "")]
+_exclude_cache_lock = threading.Lock() # Submodule diffs are collected from several threads
 
 def load_config():
     """Loads configuration from the JSON file."""
@@ -32,6 +54,22 @@ def save_config(config_data):
     with open(CONFIG_FILE, 'w') as f:
         json.dump(config_data, f, indent=2)
 
+def load_stats():
+    """Loads recorded generation statistics from the JSON file."""
+    if not os.path.exists(STATS_FILE):
+        return {}
+    try:
+        with open(STATS_FILE, 'r') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return {}
+
+def save_stats(stats_data):
+    """Saves generation statistics to the JSON file."""
+    os.makedirs(CONFIG_DIR, exist_ok=True)
+    with open(STATS_FILE, 'w') as f:
+        json.dump(stats_data, f, indent=2)
+
 
 # --- System Prompt  ---
 DEFAULT_GIT_COMMIT_SYSTEM_PROMPT = """
@@ -146,6 +184,38 @@ The system will use the text between the markers for user confirmation.
 PROPOSED_COMMIT_MARKER_START = "PROPOSED_COMMIT_MESSAGE_START"
 PROPOSED_COMMIT_MARKER_END = "PROPOSED_COMMIT_MESSAGE_END"
 
+# --- Commit Message Rules ---
+# Generated messages are checked against these rules (overridable via the "rules" config key).
+# Violations that can be fixed deterministically are repaired locally; anything left triggers
+# a single targeted re-prompt listing the specific violations.
+DEFAULT_MESSAGE_RULES = {
+    "conventional": True, # Gates the header, type, scope and subject-period checks
+    "types": ["feat", "fix", "docs", "style", "refactor", "perf", "test", "build", "ci", "chore", "revert"],
+    "scope-pattern": r"[\w./-]+",
+    "subject-max": 50,
+    "body-wrap": 72,
+    "forbidden-phrases": ["here's the commit message", "here is the commit message", "as an ai"],
+}
+
+MESSAGE_REPAIR_PROMPT_TEMPLATE = """
+The commit message below breaks these rules:
+{violations}
+
+Rewrite it so that it follows the rules, keeping its meaning. Return ONLY the raw commit message text.
+
+--- COMMIT MESSAGE START ---
+{message}
+--- COMMIT MESSAGE END ---
+
+--- DIFF START ---
+{diff}
+--- DIFF END ---
+"""
+
+CONVENTIONAL_HEADER_RE = re.compile(r"^(?P<type>[A-Za-z]+)(?:\((?P<scope>[^)]*)\))?(?P<breaking>!)?: (?P<subject>\S.*)$")
+LOOSE_HEADER_RE = re.compile(r"^(?P<type>[A-Za-z]+)\s*(?:\(\s*(?P<scope>[^)]*?)\s*\))?\s*(?P<breaking>!)?\s*:\s*(?P<subject>\S.*)$")
+PREAMBLE_RE = re.compile(r"^(?:(?:sure|certainly|okay|ok)\b(?:[^\n]*[:!]|\.)?|here(?:'s| is| are)\b[^\n]*:)\s*$", re.IGNORECASE)
+
 # --- LLM Plugin Hook ---
 @llm.hookimpl
 def register_commands(cli):
@@ -183,7 +253,23 @@ def register_commands(cli):
         "-y", "--yes", is_flag=True,
         help="Automatically confirm and proceed with the commit without interactive editing (uses LLM output directly)."
     )
-    def git_commit_command(ctx, diff_mode, model_id_override, system_prompt_override, max_chars_override, api_key_override, yes):
+    @click.option(
+        "--explain-route", is_flag=True,
+        help="Show how the diff was matched against the configured model routes."
+    )
+    @click.option(
+        "--recurse-submodules", is_flag=True,
+        help="Include changes inside dirty submodules in the prompt."
+    )
+    @click.option(
+        "--commit-submodules", is_flag=True,
+        help="With --recurse-submodules, generate and commit inside each dirty submodule before the superproject commit."
+    )
+    @click.option(
+        "--resume", is_flag=True,
+        help="Reopen the saved draft and chat history for the current changes instead of generating a new message."
+    )
+    def git_commit_command(ctx, diff_mode, model_id_override, system_prompt_override, max_chars_override, api_key_override, yes, explain_route, recurse_submodules, commit_submodules, resume):
         """
         Generates Git commit messages using an LLM.
 
@@ -207,7 +293,15 @@ def register_commands(cli):
         if diff_output is None: # Error occurred in _get_git_diff
             return
 
-        if not diff_output.strip():
+        submodule_diffs = []
+        if recurse_submodules:
+            submodule_diffs = _collect_submodule_diffs(diff_mode)
+            if submodule_diffs:
+                click.echo(f"Found changes in {len(submodule_diffs)} submodule(s): {', '.join(path for path, _, _ in submodule_diffs)}")
+        elif commit_submodules:
+            click.echo(click.style("Warning: --commit-submodules has no effect without --recurse-submodules.", fg="yellow"))
+
+        if not diff_output.strip() and not submodule_diffs:
             if diff_mode == "staged":
                 click.echo("No staged changes found.")
                 _show_git_status()
@@ -235,8 +329,24 @@ def register_commands(cli):
         from llm.cli import get_default_model # Import here to ensure LLM environment is ready
 
         
+        # --- Route the diff to a model tier (an explicit --model always wins) ---
+        diff_stats = _summarize_diff(diff_output + "".join(diff for _, _, diff in submodule_diffs))
+        configured_routes = config.get("routes") or []
+        route, route_explanation = _select_route(configured_routes, diff_stats)
+        invalid_routes = [r for r in configured_routes if _route_problems(r)] if isinstance(configured_routes, list) else [configured_routes]
+        if invalid_routes and not explain_route:
+            click.echo(click.style("Warning: Some configured routes are invalid and were ignored (see --explain-route).", fg="yellow"))
+        if explain_route:
+            click.echo(click.style("Route decision:", fg="cyan"))
+            for line in route_explanation:
+                click.echo(f"  {line}")
+            if model_id_override and route:
+                click.echo(f"  --model {model_id_override} overrides route '{route.get('name')}'.")
+
         configured_model = config.get("model")
-        actual_model_id = model_id_override or configured_model or get_default_model()
+        routed_model = route.get("model") if route and not model_id_override else None
+        actual_model_id = model_id_override or routed_model or configured_model or get_default_model()
+        route_name = route.get("name") if routed_model else None
         
         if not actual_model_id:
             click.echo(click.style("Error: No LLM model specified or configured.", fg="red"))
@@ -257,27 +367,87 @@ def register_commands(cli):
                 click.echo(f"Set via 'llm keys set {model_obj.needs_key}', --key option, or ${model_obj.key_env_var}.")
                 return
 
-        # --- Truncate diff using the resolved max_chars value ---
+        # --- Logic to determine the system prompt with config precedence ---
+        system_prompt = system_prompt_override or config.get("system") or DEFAULT_GIT_COMMIT_SYSTEM_PROMPT
+
         max_chars = max_chars_override or config.get("max-chars") or DEFAULT_MAX_CHARS
-        if len(diff_output) > max_chars:
+
+        message_rules = _resolve_message_rules(config.get("rules"))
+
+        # --- Look for a saved session before anything makes new LLM calls or commits ---
+        _prune_sessions()
+        session_path = _get_session_path(diff_mode, diff_output)
+        resumed_session = _load_session(session_path) if resume and session_path else None
+        if resume and resumed_session is None:
+            click.echo(click.style("No saved session for the current changes; generating a new message.", fg="yellow"))
+        elif not resume and _load_session(session_path) is not None:
+            click.echo(click.style(
+                "Saved session found; run with --resume to reopen it. "
+                "It is kept until a new message has been generated.", fg="yellow"
+            ))
+
+        if commit_submodules and submodule_diffs and resumed_session:
+            click.echo(click.style("Resuming a saved session; skipping submodule commits.", fg="yellow"))
+        elif commit_submodules and submodule_diffs:
+            if not _commit_submodules(submodule_diffs, diff_mode, model_obj, system_prompt, max_chars, yes, message_rules):
+                click.echo("Commit aborted.")
+                return
+            diff_output, diff_description = _get_git_diff(diff_mode)
+            if diff_output is None:
+                return
+            session_path = _get_session_path(diff_mode, diff_output) # The staged tree now has the submodule updates
+
+        if not diff_output.strip():
+            click.echo(click.style("Nothing to commit in the superproject. Commit inside the submodules first, or use --commit-submodules.", fg="yellow"))
+            return
+
+        # --- Truncate diff using the resolved max_chars value ---
+        if submodule_diffs:
+            sections = [("Superproject", diff_output)] + [(f"Submodule: {path}", diff) for path, _, diff in submodule_diffs]
+            diff_output = _budget_diff_sections(sections, max_chars)
+            diff_description += f" (with {len(submodule_diffs)} submodule(s))"
+        elif len(diff_output) > max_chars:
             click.echo(click.style(f"Warning: Diff is very long ({len(diff_output)} chars), truncating to {max_chars} chars for LLM.", fg="yellow"))
             diff_output = diff_output[:max_chars] + "\n\n... [diff truncated]"
-
-        # --- Logic to determine the system prompt with config precedence ---
-        system_prompt = system_prompt_override or config.get("system") or DEFAULT_GIT_COMMIT_SYSTEM_PROMPT
         
-        click.echo(f"Generating commit message using {click.style(actual_model_id, bold=True)} based on {diff_description}...")
+        # --- Use the resumed session, or generate a fresh message and start one ---
+        if resumed_session:
+            generated_message, chat_history = resumed_session
+            click.echo(click.style(f"Resumed saved session ({len(chat_history)} chat message(s)).", fg="green"))
+        else:
+            click.echo(f"Generating commit message using {click.style(actual_model_id, bold=True)} based on {diff_description}...")
         
-        try:
-            response_obj = model_obj.prompt(diff_output, system=system_prompt)
-            generated_message = response_obj.text().strip()
-        except Exception as e:
-            click.echo(click.style(f"Error calling LLM: {e}", fg="red"))
-            return
+            try:
+                started_at = time.monotonic()
+                response_obj = model_obj.prompt(diff_output, system=system_prompt)
+                generated_message = response_obj.text().strip()
+                elapsed = time.monotonic() - started_at
+            except Exception as e:
+                click.echo(click.style(f"Error calling LLM: {e}", fg="red"))
+                return
+
+            click.echo(click.style(f"Generated in {elapsed:.2f}s" + (f" (route: {route_name})" if route_name else ""), dim=True))
+            _record_generation({
+                "timestamp": time.time(),
+                "model": actual_model_id,
+                "route": route_name,
+                "seconds": round(elapsed, 3),
+                "diff_chars": diff_stats["chars"],
+                "diff_files": diff_stats["files"],
+            })
 
-        if not generated_message:
-            click.echo(click.style("LLM returned an empty commit message. Please write one manually or try again.", fg="yellow"))
-            generated_message = ""
+            if not generated_message:
+                click.echo(click.style("LLM returned an empty commit message. Please write one manually or try again.", fg="yellow"))
+                generated_message = ""
+            else:
+                generated_message = _postprocess_message(generated_message, message_rules, model_obj, diff_output, system_prompt)
+
+            chat_history = []
+            # Replaces any older session only now that the new draft exists.
+            _start_session(session_path, [
+                {"t": "meta", "mode": diff_mode, "model": actual_model_id, "created": time.time()},
+                {"t": "draft", "m": generated_message},
+            ])
 
         #  Interactive Edit & Commit or Direct Commit
         if yes:
@@ -288,13 +458,17 @@ def register_commands(cli):
             click.echo(click.style("\nUsing LLM-generated message directly:", fg="cyan"))
             click.echo(f'"""\n{final_message}\n"""')
         else:
-            final_message = _interactive_edit_message(generated_message, diff_output, model_obj)
+            final_message = _interactive_edit_message(generated_message, diff_output, model_obj, chat_history, session_path)
 
         if final_message is None or not final_message.strip():
             click.echo("Commit aborted.")
             return
-        
-        _execute_git_commit(final_message, diff_mode == "tracked")
+
+        _append_session_record(session_path, {"t": "draft", "m": final_message})
+        if _execute_git_commit(final_message, diff_mode == "tracked"):
+            _remove_session(session_path)
+        elif session_path:
+            click.echo(click.style("Draft saved. Run 'llm git-commit --resume' to pick it up again.", fg="cyan"))
 
     # --- 'config' subcommand attached to the git_commit_command group ---
     @git_commit_command.command(name="config")
@@ -303,8 +477,10 @@ def register_commands(cli):
     @click.option("-m", "--model", "model_config", default=None, help="Set the default model.")
     @click.option("-s", "--system", "system_config", default=None, help="Set the default system prompt.")
     @click.option("--max-chars", "max_chars_config", type=int, default=None, help="Set the default max characters.")
+    @click.option("--routes", "routes_config", default=None, help="Set model routing tiers as a JSON list ('[]' clears them).")
+    @click.option("--rules", "rules_config", default=None, help="Override commit message rules as a JSON object ('{}' restores defaults).")
     @click.pass_context
-    def config_command(ctx, view, reset, model_config, system_config, max_chars_config):
+    def config_command(ctx, view, reset, model_config, system_config, max_chars_config, routes_config, rules_config):
         """
         View or set persistent default options for llm-git-commit.
         
@@ -313,6 +489,8 @@ def register_commands(cli):
           llm git-commit config --view
           llm git-commit config --model gpt-4-turbo
           llm git-commit config --max-chars 8000
+          llm git-commit config --routes '[{"name": "small", "model": "gpt-4o-mini", "max-chars": 2000, "max-files": 3}, {"name": "large", "model": "gpt-4o"}]'
+          llm git-commit config --rules '{"subject-max": 72, "types": ["feat", "fix", "chore"]}'
           llm git-commit config --reset
         """
         config_data = load_config()
@@ -350,12 +528,72 @@ def register_commands(cli):
             click.echo(f"Default max-chars set to: {max_chars_config}")
             updates_made = True
 
+        if routes_config is not None:
+            try:
+                routes = json.loads(routes_config)
+            except json.JSONDecodeError as e:
+                raise click.BadParameter(f"Invalid JSON: {e}", param_hint="--routes")
+            if not isinstance(routes, list):
+                raise click.BadParameter("Expected a JSON list of route objects.", param_hint="--routes")
+            for index, route in enumerate(routes):
+                problems = _route_problems(route)
+                if problems:
+                    raise click.BadParameter(f"Route {index + 1}: {'; '.join(problems)}.", param_hint="--routes")
+            config_data["routes"] = routes
+            click.echo(f"Model routes set ({len(routes)} tier(s)).")
+            updates_made = True
+
+        if rules_config is not None:
+            try:
+                rules = json.loads(rules_config)
+            except json.JSONDecodeError as e:
+                raise click.BadParameter(f"Invalid JSON: {e}", param_hint="--rules")
+            if not isinstance(rules, dict):
+                raise click.BadParameter("Expected a JSON object.", param_hint="--rules")
+            problems = _rule_problems(rules)
+            if problems:
+                raise click.BadParameter("; ".join(problems.values()) + ".", param_hint="--rules")
+            config_data["rules"] = rules
+            click.echo("Commit message rules set.")
+            updates_made = True
+
         if updates_made:
             save_config(config_data)
         else:
             click.echo(ctx.get_help())
 
 
+    # --- 'stats' subcommand attached to the git_commit_command group ---
+    @git_commit_command.command(name="stats")
+    def stats_command():
+        """
+        Show recorded generation timings and commit message rule hit rates.
+        """
+        stats = load_stats()
+        click.echo(f"Statistics file location: {STATS_FILE}")
+
+        generations = stats.get("generations", [])
+        if generations:
+            click.echo(click.style(f"\nGenerations (last {len(generations)}):", bold=True))
+            by_route = {}
+            for entry in generations:
+                by_route.setdefault(entry.get("route") or "(no route)", []).append(entry.get("seconds", 0))
+            for route_name, seconds in sorted(by_route.items()):
+                seconds = sorted(seconds)
+                click.echo(f"  {route_name}: {len(seconds)} run(s), median {seconds[len(seconds) // 2]:.2f}s")
+        else:
+            click.echo("\nNo generations recorded yet.")
+
+        checked = stats.get("messages_checked", 0)
+        if checked:
+            click.echo(click.style(f"\nRule hits ({checked} message(s) checked, {stats.get('reprompts', 0)} re-prompt(s)):", bold=True))
+            for rule, counts in sorted(stats.get("rule_hits", {}).items(), key=lambda item: -item[1]["violated"]):
+                click.echo(
+                    f"  {rule}: {counts['violated'] / checked:.0%} hit rate "
+                    f"(repaired {counts['repaired']}, re-prompt fixed {counts['reprompt-fixed']}, unresolved {counts['unresolved']})"
+                )
+
+
 # --- Helper Functions  ---
 
 def _format_chat_history_for_prompt(chat_history: list) -> str: 
@@ -364,6 +602,296 @@ def _format_chat_history_for_prompt(chat_history: list) -> str:
         return "No conversation history yet."
     return "\n".join([f"{msg['role'].capitalize()}: {msg['content']}" for msg in chat_history])
 
+def _summarize_diff(diff_text: str) -> dict:
+    """Collects size, file count and change kinds from a unified diff for routing."""
+    files = 0
+    kinds = set()
+    current_kind = None
+    for line in diff_text.splitlines():
+        if line.startswith("diff --git "):
+            if current_kind:
+                kinds.add(current_kind)
+            files += 1
+            current_kind = "modified"
+        elif current_kind == "modified":
+            if line.startswith("new file mode"):
+                current_kind = "added"
+            elif line.startswith("deleted file mode"):
+                current_kind = "deleted"
+            elif line.startswith("rename from"):
+                current_kind = "renamed"
+            elif line.startswith("Binary files"):
+                current_kind = "binary"
+    if current_kind:
+        kinds.add(current_kind)
+    return {
+        "chars": len(diff_text),
+        "tokens": len(diff_text) // 4, # Rough estimate, good enough for picking a tier
+        "files": files,
+        "kinds": sorted(kinds),
+    }
+
+def _route_problems(route) -> list:
+    """Returns what is wrong with a route tier definition (an empty list if it is usable)."""
+    if not isinstance(route, dict):
+        return ["must be a JSON object"]
+    problems = []
+    if not isinstance(route.get("model"), str) or not route.get("model"):
+        problems.append("'model' must be a non-empty string")
+    for key, _ in ROUTE_LIMIT_KEYS:
+        limit = route.get(key)
+        if limit is not None and (isinstance(limit, bool) or not isinstance(limit, int) or limit < 0):
+            problems.append(f"'{key}' must be a non-negative integer")
+    kinds = route.get("kinds")
+    if kinds is not None:
+        if not isinstance(kinds, list) or not all(isinstance(kind, str) for kind in kinds):
+            problems.append(f"'kinds' must be a list of: {', '.join(DIFF_CHANGE_KINDS)}")
+        else:
+            unknown = [kind for kind in kinds if kind not in DIFF_CHANGE_KINDS]
+            if unknown:
+                problems.append(f"unknown kind(s) {', '.join(unknown)}; expected: {', '.join(DIFF_CHANGE_KINDS)}")
+    return problems
+
+def _select_route(routes: list, diff_stats: dict):
+    """
+    Picks the first route tier whose limits the diff fits within.
+    A tier may set 'max-chars', 'max-tokens', 'max-files' and 'kinds' (allowed change kinds);
+    a tier without limits matches everything. Returns (route or None, explanation lines).
+    """
+    explanation = [
+        f"diff: {diff_stats['chars']} chars, ~{diff_stats['tokens']} tokens, "
+        f"{diff_stats['files']} file(s), kinds: {', '.join(diff_stats['kinds']) or 'none'}"
+    ]
+    if not routes:
+        explanation.append("No routes configured; using the default model.")
+        return None, explanation
+    if not isinstance(routes, list):
+        explanation.append("Configured routes are not a list; ignoring them and using the default model.")
+        return None, explanation
+
+    for index, route in enumerate(routes):
+        problems = _route_problems(route)
+        if problems:
+            # Hand-edited config: skip the broken tier instead of failing the whole run.
+            explanation.append(f"tier {index + 1}: ignored, invalid ({'; '.join(problems)})")
+            continue
+        name = route.get("name") or f"tier {index + 1}"
+        reasons = []
+        for key, stat in ROUTE_LIMIT_KEYS:
+            limit = route.get(key)
+            if limit is not None and diff_stats[stat] > limit:
+                reasons.append(f"{stat} {diff_stats[stat]} > {limit}")
+        allowed_kinds = route.get("kinds")
+        if allowed_kinds is not None:
+            unexpected = [kind for kind in diff_stats["kinds"] if kind not in allowed_kinds]
+            if unexpected:
+                reasons.append(f"kinds {', '.join(unexpected)} not in {', '.join(allowed_kinds)}")
+        if reasons:
+            explanation.append(f"{name} ({route.get('model')}): skipped, {'; '.join(reasons)}")
+            continue
+        explanation.append(f"{name} ({route.get('model')}): selected")
+        return dict(route, name=name), explanation
+
+    explanation.append("No route matched; using the default model.")
+    return None, explanation
+
+def _record_generation(entry: dict):
+    """Appends a generation timing entry to the stats file, keeping the most recent ones."""
+    stats = load_stats()
+    generations = stats.get("generations", [])
+    generations.append(entry)
+    stats["generations"] = generations[-MAX_STATS_HISTORY:]
+    try:
+        save_stats(stats)
+    except OSError:
+        pass # Stats are best-effort and must never block a commit
+
+def _rule_problems(rules: dict) -> dict:
+    """Returns {rule name: what is wrong with its value} for configured message rules."""
+    problems = {}
+    for name, value in rules.items():
+        if name not in DEFAULT_MESSAGE_RULES:
+            problems[name] = f"unknown rule '{name}' (known: {', '.join(DEFAULT_MESSAGE_RULES)})"
+        elif name == "conventional" and not isinstance(value, bool):
+            problems[name] = "'conventional' must be true or false"
+        elif name in ("types", "forbidden-phrases") and (not isinstance(value, list) or not all(isinstance(item, str) for item in value)):
+            problems[name] = f"'{name}' must be a list of strings"
+        elif name in ("subject-max", "body-wrap") and (isinstance(value, bool) or not isinstance(value, int) or value < 0):
+            problems[name] = f"'{name}' must be a non-negative integer"
+        elif name == "scope-pattern":
+            if not isinstance(value, str):
+                problems[name] = "'scope-pattern' must be a string"
+            else:
+                try:
+                    re.compile(value)
+                except re.error as e:
+                    problems[name] = f"'scope-pattern' is not a valid regular expression ({e})"
+    return problems
+
+def _resolve_message_rules(configured_rules) -> dict:
+    """Merges configured rules over the defaults, skipping invalid ones from a hand-edited config."""
+    if not configured_rules:
+        return dict(DEFAULT_MESSAGE_RULES)
+    if not isinstance(configured_rules, dict):
+        click.echo(click.style("Warning: Configured rules are not a JSON object; using the default rules.", fg="yellow"))
+        return dict(DEFAULT_MESSAGE_RULES)
+    problems = _rule_problems(configured_rules)
+    for problem in problems.values():
+        click.echo(click.style(f"Warning: Ignoring invalid rule: {problem}.", fg="yellow"))
+    valid_rules = {name: value for name, value in configured_rules.items() if name not in problems}
+    return dict(DEFAULT_MESSAGE_RULES, **valid_rules)
+
+def _validate_commit_message(message: str, rules: dict) -> list:
+    """Checks a commit message against the rule set. Returns a list of (rule, description)."""
+    violations = []
+    lines = message.splitlines()
+    if not lines:
+        return [("empty", "message is empty")]
+
+    if any(line.strip().startswith("```") for line in lines):
+        violations.append(("fences", "message contains markdown code fences"))
+    if PREAMBLE_RE.match(lines[0].strip()):
+        violations.append(("preamble", f"message starts with a preamble line: '{lines[0].strip()}'"))
+
+    subject = lines[0]
+    if rules.get("conventional"):
+        header = CONVENTIONAL_HEADER_RE.match(subject)
+        if not header:
+            violations.append(("header", "subject is not in '<type>(<scope>): <description>' form"))
+        else:
+            if rules.get("types") and header.group("type") not in rules["types"]:
+                violations.append(("type", f"type '{header.group('type')}' is not one of: {', '.join(rules['types'])}"))
+            scope = header.group("scope")
+            if scope is not None and rules.get("scope-pattern") and not re.fullmatch(rules["scope-pattern"], scope):
+                violations.append(("scope", f"scope '{scope}' does not match {rules['scope-pattern']}"))
+            if subject.rstrip().endswith("."):
+                violations.append(("subject-period", "subject ends with a period"))
+
+    subject_max = rules.get("subject-max")
+    if subject_max and len(subject) > subject_max:
+        violations.append(("subject-length", f"subject is {len(subject)} characters, limit is {subject_max}"))
+
+    if len(lines) > 1 and lines[1].strip():
+        violations.append(("blank-line", "subject is not followed by a blank line"))
+
+    body_wrap = rules.get("body-wrap")
+    if body_wrap and any(len(line) > body_wrap and " " in line.strip() for line in lines[1:]):
+        violations.append(("body-wrap", f"body has lines longer than {body_wrap} characters"))
+
+    lowered = message.lower()
+    for phrase in rules.get("forbidden-phrases") or []:
+        if phrase.lower() in lowered:
+            violations.append(("forbidden-phrase", f"message contains forbidden phrase '{phrase}'"))
+    return violations
+
+def _repair_commit_message(message: str, rules: dict) -> str:
+    """Deterministically fixes formatting problems that do not need the LLM."""
+    lines = message.strip().splitlines()
+
+    # Drop markdown fences and any chatty preamble before the actual message.
+    lines = [line for line in lines if not line.strip().startswith("```")]
+    while lines and (not lines[0].strip() or PREAMBLE_RE.match(lines[0].strip())):
+        lines.pop(0)
+    if not lines:
+        return ""
+
+    subject = lines[0].strip()
+    # Unwrap a subject quoted as a whole, but keep quotes and backticks that belong to it.
+    if len(subject) > 1 and subject[0] == subject[-1] and subject[0] in "\"'`":
+        subject = subject[1:-1].strip()
+    header = LOOSE_HEADER_RE.match(subject) if rules.get("conventional") else None
+    if header:
+        scope = header.group("scope")
+        subject = (
+            header.group("type").lower()
+            + (f"({scope})" if scope else "")
+            + (header.group("breaking") or "")
+            + ": " + header.group("subject").strip()
+        )
+    if rules.get("conventional"):
+        subject = subject.rstrip(".").rstrip()
+
+    body = [line.rstrip() for line in lines[1:]]
+    while body and not body[0].strip():
+        body.pop(0)
+    while body and not body[-1].strip():
+        body.pop()
+
+    body_wrap = rules.get("body-wrap")
+    if body_wrap:
+        wrapped = []
+        for line in body:
+            if len(line) <= body_wrap or " " not in line.strip():
+                wrapped.append(line)
+                continue
+            bullet = re.match(r"^(\s*(?:[-*]|\d+\.)\s+)", line)
+            indent = " " * len(bullet.group(1)) if bullet else re.match(r"^\s*", line).group(0)
+            wrapped.extend(textwrap.wrap(line, width=body_wrap, subsequent_indent=indent, break_long_words=False, break_on_hyphens=False))
+        body = wrapped
+
+    return "\n".join([subject] + ([""] + body if body else []))
+
+def _postprocess_message(message: str, rules: dict, model_obj, diff: str, system_prompt: str) -> str:
+    """
+    Validates a generated message, repairs what it can locally and re-prompts the
+    model once, with the specific violations, for anything that is left.
+    """
+    initial_violations = _validate_commit_message(message, rules)
+    if not initial_violations:
+        _record_rule_hits([], [], [])
+        return message # Compliant messages reach the editor unchanged
+
+    repaired = _repair_commit_message(message, rules) or message
+    remaining = _validate_commit_message(repaired, rules)
+    locally_unresolved = remaining
+
+    if remaining:
+        click.echo(click.style(f"Generated message breaks {len(remaining)} rule(s); asking the LLM to fix them...", fg="yellow"))
+        repair_prompt = MESSAGE_REPAIR_PROMPT_TEMPLATE.format(
+            violations="\n".join(f"- {rule}: {description}" for rule, description in remaining),
+            message=repaired,
+            diff=diff,
+        )
+        try:
+            retry = model_obj.prompt(repair_prompt, system=system_prompt).text().strip()
+        except Exception as e:
+            click.echo(click.style(f"Error calling LLM: {e}", fg="red"))
+            retry = ""
+        retry = _repair_commit_message(retry, rules) if retry else ""
+        if retry:
+            retry_violations = _validate_commit_message(retry, rules)
+            if len(retry_violations) < len(remaining):
+                repaired, remaining = retry, retry_violations
+
+    if remaining:
+        click.echo(click.style("Message still breaks: " + "; ".join(description for _, description in remaining), fg="yellow"))
+
+    _record_rule_hits(initial_violations, locally_unresolved, remaining)
+    return repaired
+
+def _record_rule_hits(initial_violations: list, locally_unresolved: list, final_violations: list):
+    """Counts per-rule violations and how each was resolved (locally, by re-prompt, or not at all)."""
+    stats = load_stats()
+    stats["messages_checked"] = stats.get("messages_checked", 0) + 1
+    if locally_unresolved:
+        stats["reprompts"] = stats.get("reprompts", 0) + 1
+    rule_hits = stats.setdefault("rule_hits", {})
+    after_local = {rule for rule, _ in locally_unresolved}
+    after_reprompt = {rule for rule, _ in final_violations}
+    for rule in {rule for rule, _ in initial_violations} | after_local | after_reprompt:
+        counts = rule_hits.setdefault(rule, {"violated": 0, "repaired": 0, "reprompt-fixed": 0, "unresolved": 0})
+        counts["violated"] += 1
+        if rule in after_reprompt:
+            counts["unresolved"] += 1
+        elif rule in after_local:
+            counts["reprompt-fixed"] += 1
+        else:
+            counts["repaired"] += 1
+    try:
+        save_stats(stats)
+    except OSError:
+        pass # Stats are best-effort and must never block a commit
+
 def _is_git_repository():
     """Checks if the current directory is part of a git repository."""
     try:
@@ -376,7 +904,7 @@ def _is_git_repository():
     except (subprocess.CalledProcessError, FileNotFoundError):
         return False
 
-def _get_git_diff(diff_mode):
+def _get_git_diff(diff_mode, cwd="."):
     """Gets the git diff output based on the specified mode."""
     diff_command = ["git", "diff"]
     if diff_mode == "staged":
@@ -389,12 +917,20 @@ def _get_git_diff(diff_mode):
         click.echo(click.style(f"Internal error: Unknown diff mode '{diff_mode}'.", fg="red"))
         return None, "unknown changes"
         
+    excludes = _get_excludes(cwd)
     try:
         process = subprocess.run(
-            diff_command, capture_output=True, text=True, check=True, cwd=".",
+            diff_command + ["--", ":(top)"] + [f":(top,exclude,{magic}){pattern}" for magic, pattern in excludes],
+            capture_output=True, text=True, check=True, cwd=cwd,
             encoding="utf-8", errors="ignore"
         )
-        return process.stdout, description
+        # Summarize the excluded files with a single numstat line each instead of their hunks.
+        numstat = subprocess.run(
+            diff_command + ["--numstat", "--"] + [f":(top,{magic}){pattern}" for magic, pattern in excludes],
+            capture_output=True, text=True, check=True, cwd=cwd,
+            encoding="utf-8", errors="ignore"
+        ).stdout
+        return _format_excluded_summary(numstat) + process.stdout, description
     except subprocess.CalledProcessError as e:
         click.echo(click.style(f"Error getting git diff ({' '.join(diff_command)}):\n{e.stderr or e.stdout}", fg="red"))
         return None, description
@@ -403,6 +939,347 @@ def _get_git_diff(diff_mode):
         return None, description
 
 
+def _get_repo_root(cwd="."):
+    """Returns the absolute path of the repository's top-level directory, or None."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--show-toplevel"], text=True, cwd=cwd,
+            encoding="utf-8", errors="ignore", stderr=subprocess.DEVNULL
+        ).strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+
+def _list_submodules(repo_path):
+    """
+    Returns (path relative to repo_path, absolute path) for the initialized submodules of one
+    repository, read from its .gitmodules (no 'git submodule status', which describes each one).
+    """
+    gitmodules = os.path.join(repo_path, ".gitmodules")
+    if not os.path.exists(gitmodules):
+        return []
+    try:
+        config_output = subprocess.run(
+            ["git", "config", "-z", "--file", gitmodules, "--get-regexp", r"^submodule\..*\.path$"],
+            capture_output=True, text=True, cwd=repo_path,
+            encoding="utf-8", errors="ignore"
+        ).stdout
+    except FileNotFoundError:
+        return []
+
+    submodules = []
+    for record in config_output.split("\0"):
+        # Each record is "submodule.<name>.path\n<path>".
+        _, _, path = record.partition("\n")
+        if not path:
+            continue
+        abs_path = os.path.join(repo_path, path)
+        if os.path.exists(os.path.join(abs_path, ".git")): # Skip uninitialized submodules
+            submodules.append((path, abs_path))
+    return submodules
+
+def _inspect_submodule(diff_mode, abs_path):
+    """Worker: returns the submodule's diff and its own submodules, so nesting is discovered in parallel."""
+    diff, _ = _get_git_diff(diff_mode, cwd=abs_path)
+    return diff, _list_submodules(abs_path)
+
+def _collect_submodule_diffs(diff_mode):
+    """
+    Collects diffs from all submodules, recursively, with a worker pool.
+    Returns a list of (display path, absolute path, diff) for submodules with changes.
+    """
+    toplevel = _get_repo_root()
+    if not toplevel:
+        return []
+    submodules = _list_submodules(toplevel)
+    if not submodules:
+        return []
+
+    changed = []
+    with ThreadPoolExecutor(max_workers=MAX_SUBMODULE_WORKERS) as executor:
+        pending = {executor.submit(_inspect_submodule, diff_mode, abs_path): (path, abs_path) for path, abs_path in submodules}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, abs_path = pending.pop(future)
+                diff, children = future.result()
+                if diff and diff.strip():
+                    changed.append((path, abs_path, diff))
+                for child_path, child_abs_path in children:
+                    pending[executor.submit(_inspect_submodule, diff_mode, child_abs_path)] = (f"{path}/{child_path}", child_abs_path)
+    return sorted(changed)
+
+def _budget_diff_sections(sections, max_chars):
+    """
+    Merges (title, diff) sections into one prompt that fits within max_chars.
+    Small sections are kept whole and their unused share is handed to larger ones.
+    """
+    headers = [f"=== {title} ===\n" for title, _ in sections]
+    remaining = max(0, max_chars - sum(len(header) for header in headers))
+    budgets = {}
+    # Fill the smallest sections first so each gets at least a fair share of what is left.
+    order = sorted(range(len(sections)), key=lambda i: len(sections[i][1]))
+    for position, index in enumerate(order):
+        share = remaining // (len(order) - position)
+        budgets[index] = min(len(sections[index][1]), share)
+        remaining -= budgets[index]
+
+    parts = []
+    for index, (header, (title, diff)) in enumerate(zip(headers, sections)):
+        body = diff
+        if len(diff) > budgets[index]:
+            click.echo(click.style(f"Warning: {title} diff is {len(diff)} chars, truncating to {budgets[index]} chars for LLM.", fg="yellow"))
+            body = diff[:budgets[index]] + "\n\n... [diff truncated]"
+        parts.append(header + (body if body.strip() else "(no changes)\n"))
+    return "\n".join(parts)
+
+def _commit_submodules(submodule_diffs, diff_mode, model_obj, system_prompt, max_chars, yes, message_rules):
+    """
+    Generates a message and commits inside each changed submodule, deepest first, staging
+    each new commit in its immediate parent repository. Parents of changed nested submodules
+    are committed too, so the superproject ends up with every submodule update staged.
+    Returns False if the user aborts.
+    """
+    superproject_root = _get_repo_root()
+    if not superproject_root:
+        return False
+
+    # Map every submodule that needs a commit to its immediate parent repository.
+    parents = {}
+    for _, abs_path, _ in submodule_diffs:
+        while abs_path not in parents:
+            parent_root = _get_repo_root(cwd=os.path.dirname(abs_path))
+            if not parent_root:
+                click.echo(click.style(f"Error: Could not find the repository containing '{abs_path}'.", fg="red"))
+                return False
+            parents[abs_path] = parent_root
+            if os.path.normpath(parent_root) == os.path.normpath(superproject_root):
+                break
+            abs_path = parent_root
+
+    # Deepest first, so a parent commit includes its children's new commits.
+    ordered = sorted(parents, key=lambda path: (-os.path.relpath(path, superproject_root).count(os.sep), path))
+    for abs_path in ordered:
+        path = os.path.relpath(abs_path, superproject_root)
+        # Re-read the diff: staging a child's commit changes its parent's diff.
+        diff, _ = _get_git_diff(diff_mode, cwd=abs_path)
+        if diff is None:
+            return False
+        if not diff.strip():
+            continue
+
+        click.echo(click.style(f"\n--- Submodule: {path} ---", fg="magenta", bold=True))
+        prompt_diff = diff if len(diff) <= max_chars else diff[:max_chars] + "\n\n... [diff truncated]"
+        try:
+            message = model_obj.prompt(prompt_diff, system=system_prompt).text().strip()
+        except Exception as e:
+            click.echo(click.style(f"Error calling LLM for submodule '{path}': {e}", fg="red"))
+            return False
+        if message:
+            message = _postprocess_message(message, message_rules, model_obj, prompt_diff, system_prompt)
+
+        if yes:
+            click.echo(f'"""\n{message}\n"""')
+        else:
+            message = _interactive_edit_message(message, prompt_diff, model_obj)
+        if message is None or not message.strip():
+            return False
+
+        if not _execute_git_commit(message, diff_mode == "tracked", cwd=abs_path, offer_push=False):
+            return False
+        if diff_mode == "staged":
+            parent_root = parents[abs_path]
+            try:
+                subprocess.run(
+                    ["git", "add", "--", os.path.relpath(abs_path, parent_root)],
+                    check=True, cwd=parent_root, capture_output=True
+                )
+            except (subprocess.CalledProcessError, FileNotFoundError) as e:
+                click.echo(click.style(f"Error staging submodule '{path}': {e}", fg="red"))
+                return False
+    return True
+
+def load_exclude_cache():
+    """Loads compiled ignore-file patterns, keyed by repo root, from the JSON cache file."""
+    if not os.path.exists(EXCLUDE_CACHE_FILE):
+        return {}
+    try:
+        with open(EXCLUDE_CACHE_FILE, 'r') as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (json.JSONDecodeError, IOError):
+        return {}
+
+def save_exclude_cache(cache_data):
+    """Atomically saves the compiled ignore-file pattern cache."""
+    os.makedirs(CONFIG_DIR, exist_ok=True)
+    temp_file = f"{EXCLUDE_CACHE_FILE}.{os.getpid()}.tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(cache_data, f, indent=2)
+    os.replace(temp_file, EXCLUDE_CACHE_FILE)
+
+def _get_excludes(cwd="."):
+    """
+    Returns (pathspec magic, pattern) pairs, e.g. ('glob', '**/*.lock'), for files whose diffs should be skipped.
+    Compiled ignore-file patterns are cached on disk per repo root and recompiled when the file's mtime changes.
+    """
+    repo_root = _get_repo_root(cwd)
+    if not repo_root:
+        return list(ATTRIBUTE_EXCLUDES)
+
+    exclude_file = os.path.join(repo_root, EXCLUDE_FILE_NAME)
+    try:
+        mtime = os.path.getmtime(exclude_file)
+    except OSError:
+        return list(ATTRIBUTE_EXCLUDES) # No ignore file, nothing to compile or cache
+
+    with _exclude_cache_lock:
+        cache = load_exclude_cache()
+        cached = cache.get(repo_root)
+        if isinstance(cached, dict) and cached.get("mtime") == mtime and isinstance(cached.get("patterns"), list):
+            return list(ATTRIBUTE_EXCLUDES) + [tuple(entry) for entry in cached["patterns"]]
+
+        try:
+            with open(exclude_file, 'r', encoding="utf-8") as f:
+                patterns = _compile_exclude_patterns(f.read().splitlines())
+        except IOError:
+            return list(ATTRIBUTE_EXCLUDES)
+        cache[repo_root] = {"mtime": mtime, "patterns": [list(entry) for entry in patterns]}
+        try:
+            save_exclude_cache(cache)
+        except OSError:
+            pass # The cache is an optimization; the patterns are still used this run
+    return list(ATTRIBUTE_EXCLUDES) + patterns
+
+def _compile_exclude_patterns(lines):
+    """Translates gitignore-style patterns into glob pathspecs, relative to the repo root."""
+    compiled = []
+    for line in lines:
+        pattern = line.strip()
+        if not pattern or pattern.startswith("#") or pattern.startswith("!"):
+            continue # Negation is not expressible as an exclude pathspec
+        anchored = pattern.startswith("/") or "/" in pattern.rstrip("/")
+        pattern = pattern.lstrip("/")
+        if pattern.endswith("/"):
+            pattern += "**"
+        if not anchored:
+            pattern = "**/" + pattern
+        compiled.append(("glob", pattern))
+        if not pattern.endswith("/**"):
+            compiled.append(("glob", f"{pattern}/**")) # A bare name may also be a directory
+    return compiled
+
+def _format_excluded_summary(numstat_output: str) -> str:
+    """Turns 'git diff --numstat' output for excluded files into a short prompt section."""
+    lines = []
+    for line in numstat_output.splitlines():
+        parts = line.split("\t", 2)
+        if len(parts) != 3:
+            continue
+        added, deleted, path = parts
+        change = "binary" if added == "-" else f"+{added} -{deleted}"
+        lines.append(f"  {path} ({change})")
+    if not lines:
+        return ""
+    return "Excluded from diff (generated, vendored or ignored files):\n" + "\n".join(lines) + "\n\n"
+
+def _get_session_path(diff_mode, diff_text):
+    """
+    Returns the session file for the current repository and staged tree, or None.
+    In 'tracked' mode the working tree changes are not in the index, so the diff is hashed in too.
+    """
+    repo_root = _get_repo_root()
+    if not repo_root:
+        return None
+    try:
+        tree_hash = subprocess.check_output(
+            ["git", "write-tree"], text=True, cwd=".",
+            encoding="utf-8", errors="ignore", stderr=subprocess.DEVNULL
+        ).strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+    key_parts = [repo_root, diff_mode, tree_hash]
+    if diff_mode == "tracked":
+        key_parts.append(hashlib.sha1(diff_text.encode("utf-8", errors="ignore")).hexdigest())
+    key = hashlib.sha1("\0".join(key_parts).encode("utf-8")).hexdigest()
+    return os.path.join(SESSIONS_DIR, f"{key}.jsonl")
+
+def _append_session_record(session_path, record):
+    """Appends one compact JSON record to the session file (no-op without a session)."""
+    if not session_path:
+        return
+    try:
+        os.makedirs(SESSIONS_DIR, exist_ok=True)
+        with open(session_path, 'a', encoding="utf-8") as f:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+    except IOError:
+        pass # Checkpoints are best-effort and must never interrupt editing
+
+def _start_session(session_path, records):
+    """Writes a new session file atomically, so an existing one survives until this succeeds."""
+    if not session_path:
+        return
+    temp_path = f"{session_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(SESSIONS_DIR, exist_ok=True)
+        with open(temp_path, 'w', encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        os.replace(temp_path, session_path)
+    except OSError:
+        _remove_session(temp_path) # Checkpoints are best-effort and must never interrupt editing
+
+def _load_session(session_path):
+    """Replays a session file. Returns (latest draft, chat history) or None if there is no session."""
+    if not session_path or not os.path.exists(session_path):
+        return None
+    draft = None
+    chat_history = []
+    try:
+        with open(session_path, 'r', encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue # A torn final line from a crash; everything before it is still valid
+                if not isinstance(record, dict):
+                    continue # Valid JSON but not a record we wrote
+                if record.get("t") == "draft":
+                    draft = record.get("m", "")
+                elif record.get("t") == "chat":
+                    chat_history.append({"role": record.get("r"), "content": record.get("c", "")})
+    except IOError:
+        return None
+    if draft is None:
+        return None
+    return draft, chat_history
+
+def _remove_session(session_path):
+    """Deletes a session file once it is no longer needed."""
+    if session_path and os.path.exists(session_path):
+        try:
+            os.remove(session_path)
+        except OSError:
+            pass
+
+def _prune_sessions():
+    """Removes sessions older than SESSION_MAX_AGE_DAYS and keeps at most SESSION_MAX_COUNT."""
+    if not os.path.isdir(SESSIONS_DIR):
+        return
+    cutoff = time.time() - SESSION_MAX_AGE_DAYS * 24 * 60 * 60
+    sessions = []
+    for name in os.listdir(SESSIONS_DIR):
+        path = os.path.join(SESSIONS_DIR, name)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            continue
+        if mtime < cutoff:
+            _remove_session(path)
+        else:
+            sessions.append((mtime, path))
+    for _, path in sorted(sessions, reverse=True)[SESSION_MAX_COUNT:]:
+        _remove_session(path)
+
 def _show_git_status():
     """Shows a brief git status."""
     try:
@@ -419,8 +1296,15 @@ def _show_git_status():
         click.echo(click.style("Could not retrieve git status.", fg="yellow"))
 
 
-def _interactive_edit_message(suggestion: str, original_diff: str, model_obj: llm.Model):
-    """Allows interactive editing of the commit message."""
+def _interactive_edit_message(suggestion: str, original_diff: str, model_obj: llm.Model, chat_history: list = None, session_path: str = None):
+    """
+    Allows interactive editing of the commit message.
+    chat_history is shared across chat sessions (and may be restored from a saved session);
+    session_path, if given, receives a checkpoint after every chat turn.
+    """
+    if chat_history is None:
+        chat_history = []
+
     click.echo(click.style("\nSuggested commit message (edit below):", fg="cyan"))
     
     prompt_instructions_text = """\
@@ -460,7 +1344,9 @@ Commit Message:
             current_text_in_editor_buffer,
             original_diff,
             model_obj,
-            custom_style
+            custom_style,
+            chat_history,
+            session_path
         )
 
         print_formatted_text(FormattedText([
@@ -491,8 +1377,8 @@ Commit Message:
         )
     return edited_message
 
-def _execute_git_commit(message, commit_all_tracked):
-    """Executes the git commit command."""
+def _execute_git_commit(message, commit_all_tracked, cwd=".", offer_push=True):
+    """Executes the git commit command. Returns True if the commit was made."""
     commit_command = ["git"]
     action_description = "Committing"
 
@@ -508,11 +1394,11 @@ def _execute_git_commit(message, commit_all_tracked):
     
     if not click.confirm(f"Proceed?", default=True):
         click.echo("Commit aborted by user.")
-        return
+        return False
 
     try:
         process = subprocess.run(
-            commit_command, capture_output=True, text=True, check=True, cwd=".",
+            commit_command, capture_output=True, text=True, check=True, cwd=cwd,
             encoding="utf-8", errors="ignore"
         )
         click.echo(click.style("\nCommit successful!", fg="green"))
@@ -523,7 +1409,7 @@ def _execute_git_commit(message, commit_all_tracked):
             click.echo("Git stderr:")
             click.echo(process.stderr)
 
-        if click.confirm("Do you want to push the changes?", default=False):
+        if offer_push and click.confirm("Do you want to push the changes?", default=False):
             click.echo("Pushing changes...")
             try:
                 subprocess.run(
@@ -537,6 +1423,7 @@ def _execute_git_commit(message, commit_all_tracked):
                 click.echo(output if output else "No output from git push.")
             except FileNotFoundError:
                 click.echo(click.style("Error: 'git' command not found.", fg="red"))
+        return True
             
     except subprocess.CalledProcessError as e:
         click.echo(click.style("\nError during git commit:", fg="red"))
@@ -544,13 +1431,15 @@ def _execute_git_commit(message, commit_all_tracked):
         click.echo(output if output else "No output from git.")
     except FileNotFoundError:
         click.echo(click.style("Error: 'git' command not found.", fg="red"))
+    return False
 
 
-async def _chat_for_refinement(initial_commit_draft: str, original_diff: str, model: llm.Model, passed_style: Style) -> str:
+async def _chat_for_refinement(initial_commit_draft: str, original_diff: str, model: llm.Model, passed_style: Style, chat_history: list = None, session_path: str = None) -> str:
     """
     Handles interactive chat for refining commit messages.
     - Ctrl+A or /apply: Uses the current working draft, confirms, and exits.
     - LLM proposals (via markers) get a Y/N prompt to update the current working draft.
+    - chat_history is extended in place and every turn is checkpointed to session_path.
     """
 
     # Helper for printing FormattedText using the passed style sheet
@@ -573,8 +1462,13 @@ async def _chat_for_refinement(initial_commit_draft: str, original_diff: str, mo
         print_styled([('class:instruction', line)]) # Uses 'instruction' from passed_style for cyan
     print_formatted_text("---", style=passed_style)
 
-    chat_history = []
+    if chat_history is None:
+        chat_history = []
     message_being_refined_in_chat = initial_commit_draft # This is the evolving draft
+
+    def record_chat(role, content):
+        chat_history.append({"role": role, "content": content})
+        _append_session_record(session_path, {"t": "chat", "r": role, "c": content})
     # Stores the text of the last proposal from markers, cleared after Y/N or Ctrl+A action on it.
     last_marker_proposal_text = None 
     
@@ -632,6 +1526,7 @@ async def _chat_for_refinement(initial_commit_draft: str, original_diff: str, mo
 
         if cleaned_user_query.lower() == "/cancel":
             print_styled([('bold fg:ansiyellow', "\nChat cancelled. Returning original draft.")])
+            _append_session_record(session_path, {"t": "draft", "m": initial_commit_draft})
             return initial_commit_draft
 
         elif cleaned_user_query.lower() == "/apply":
@@ -667,7 +1562,7 @@ async def _chat_for_refinement(initial_commit_draft: str, original_diff: str, mo
         
         # --- Regular chat query ---
         else:
-            chat_history.append({"role": "user", "content": cleaned_user_query})
+            record_chat("user", cleaned_user_query)
             messages_for_llm = [{"role": "system", "content": get_current_chat_system_prompt()}] + chat_history
             
             extracted_proposal_text = None
@@ -749,8 +1644,9 @@ async def _chat_for_refinement(initial_commit_draft: str, original_diff: str, mo
 
                 if acceptance.lower().strip() == 'y' or not acceptance.strip():
                     message_being_refined_in_chat = extracted_proposal_text
+                    _append_session_record(session_path, {"t": "draft", "m": message_being_refined_in_chat})
                     print_styled([('bold fg:ansigreen', "Proposal accepted. Current draft updated.")])
-                    chat_history.append({"role": "user", "content": "(User accepted LLM's proposal to update draft)"}) 
+                    record_chat("user", "(User accepted LLM's proposal to update draft)")
                     assistant_response_for_history = message_being_refined_in_chat # Store accepted draft as "assistant's response"
                 else:
                     print_styled([('fg:ansiyellow', "Proposal rejected. Current draft remains unchanged.")])
@@ -766,7 +1662,7 @@ async def _chat_for_refinement(initial_commit_draft: str, original_diff: str, mo
 
             # Add the determined assistant response to history
             if assistant_response_for_history or not llm_full_response_text.strip(): # Add even if empty if LLM returned empty
-                chat_history.append({"role": "assistant", "content": assistant_response_for_history})
+                record_chat("assistant", assistant_response_for_history)
             
         print_formatted_text("---", style=passed_style) # End of turn separator
 